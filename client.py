@@ -1,17 +1,233 @@
 # client.py
 import argparse
 import logging
+import queue
 import socket
 import sys
+import threading
 import time
 
+import numpy as np
 import pyaudio
 
+# --- Constants ---
+# Max chunks waiting for the log writer before new ones are dropped
+LOG_QUEUE_MAX_CHUNKS = 256
+# Chunks formatted in memory before one batched write to the data log
+LOG_BATCH_CHUNKS = 50
+LOG_FILE_BUFFER_BYTES = 1 << 20
+# How long cleanup waits on the log writer before giving up on it
+LOG_FLUSH_TIMEOUT_S = 5.0
+# Pre-bound format methods skip re-parsing an f-string per chunk
+LOG_LINE_FORMAT = "{},{},[{}...]\n".format
+LOG_SAMPLE_FORMAT = "  Sample {}: {}\n".format
+# Kernel receive buffer for the audio socket
+SOCKET_RCVBUF_BYTES = 1 << 20
+# Playback ring buffer capacity, in PyAudio callback periods
+PLAYBACK_BUFFER_PERIODS = 8
+# Jitter buffer depth bounds and adaptation
+JITTER_MIN_MS = 20
+JITTER_MAX_MS = 60
+# Target depth as a multiple of the running jitter estimate
+JITTER_SAFETY_FACTOR = 4
+# Weight of each new sample in the running jitter estimate
+JITTER_GAIN = 1 / 16
+# Default u8 silence is 128 (midpoint of 0-255)
+DEFAULT_U8_SILENCE_BYTE_VALUE = 128
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
+# --- Playback Buffer ---
+class PlaybackBuffer:
+    """Adaptive jitter buffer between the socket thread and the PyAudio callback.
+
+    ``push`` blocks while the buffer is full, giving the receive loop the
+    same backpressure a blocking ``stream.write`` had. ``pop`` never
+    blocks: it is called on PortAudio's realtime thread and pads any
+    shortfall with silence.
+
+    Playback only starts once the buffer holds ``target_ms`` of audio.
+    The target follows the measured network jitter (RFC 3550 style
+    running estimate of inter-arrival deviation), clamped to
+    JITTER_MIN_MS..JITTER_MAX_MS. An underrun re-primes the buffer; a
+    backlog well past the target is trimmed from the oldest audio to
+    keep latency bounded.
+    """
+
+    def __init__(self, capacity, silence_byte, frame_bytes, bytes_per_sec):
+        self._buf = bytearray(capacity)
+        self._capacity = capacity
+        self._read_pos = 0
+        self._size = 0
+        self._silence_byte = silence_byte
+        self._frame_bytes = frame_bytes
+        self._bytes_per_sec = bytes_per_sec
+        self._cond = threading.Condition()
+
+        # Jitter tracking, updated on every push
+        self._last_arrival = None
+        self._jitter_s = 0.0
+        self.target_ms = JITTER_MIN_MS
+        self._primed = False
+        self._draining = False
+        self.underruns = 0
+        self.dropped_bytes = 0
+
+    def _ms_to_bytes(self, ms):
+        frames = int(self._bytes_per_sec * ms / 1000) // self._frame_bytes
+        return frames * self._frame_bytes
+
+    def _update_jitter(self, nbytes):
+        """Folds one arrival into the jitter estimate and retargets depth."""
+        now = time.monotonic()
+        if self._last_arrival is not None:
+            # Deviation of the actual gap from the audio duration received
+            deviation = abs(
+                (now - self._last_arrival) - nbytes / self._bytes_per_sec
+            )
+            self._jitter_s += (deviation - self._jitter_s) * JITTER_GAIN
+            target_ms = JITTER_SAFETY_FACTOR * self._jitter_s * 1000
+            self.target_ms = min(max(target_ms, JITTER_MIN_MS), JITTER_MAX_MS)
+        self._last_arrival = now
+
+    def push(self, data):
+        """Copies data into the buffer, waiting for free space as needed."""
+        view = memoryview(data)
+        with self._cond:
+            self._update_jitter(len(view))
+            while view:
+                self._cond.wait_for(lambda: self._size < self._capacity)
+                n = min(self._capacity - self._size, len(view))
+                write_pos = (self._read_pos + self._size) % self._capacity
+                first = min(n, self._capacity - write_pos)
+                self._buf[write_pos:write_pos + first] = view[:first]
+                self._buf[:n - first] = view[first:n]
+                self._size += n
+                view = view[n:]
+            if self._size >= self._ms_to_bytes(self.target_ms):
+                self._primed = True
+
+    def pop(self, n):
+        """Returns exactly n bytes, padding with silence when not primed."""
+        with self._cond:
+            take = 0
+            if self._primed or self._draining:
+                target_bytes = self._ms_to_bytes(self.target_ms)
+                # Too far behind real time: skip the oldest audio
+                excess = self._size - n - 2 * target_bytes
+                if excess > 0 and not self._draining:
+                    excess -= excess % self._frame_bytes
+                    self._read_pos = (self._read_pos + excess) % self._capacity
+                    self._size -= excess
+                    self.dropped_bytes += excess
+
+                take = min(n, self._size)
+                if take < n and not self._draining:
+                    # Underrun: play nothing until the buffer refills
+                    self.underruns += 1
+                    self._primed = False
+                    take = 0
+
+            first = min(take, self._capacity - self._read_pos)
+            out = bytearray(self._buf[self._read_pos:self._read_pos + first])
+            out += self._buf[:take - first]
+            self._read_pos = (self._read_pos + take) % self._capacity
+            self._size -= take
+            self._cond.notify_all()
+        if take < n:
+            out += bytes([self._silence_byte]) * (n - take)
+        return bytes(out)
+
+    def wait_until_empty(self, timeout=None):
+        """Plays out whatever is buffered and blocks until it has been played."""
+        with self._cond:
+            self._draining = True
+            return self._cond.wait_for(lambda: self._size == 0, timeout)
+
+
+# --- Helper Functions ---
+# Seconds-resolution prefix reused by chunk_timestamp within the same second
+_timestamp_second = None
+_timestamp_prefix = ""
+
+
+def chunk_timestamp():
+    """Returns the local wall-clock time as HH:MM:SS.mmm.
+
+    time.strftime has no portable sub-second directive, so the HH:MM:SS
+    part is formatted once per second and the milliseconds are appended.
+    """
+    global _timestamp_second, _timestamp_prefix
+    now = time.time()
+    second = int(now)
+    if second != _timestamp_second:
+        _timestamp_prefix = time.strftime("%H:%M:%S", time.localtime(second))
+        _timestamp_second = second
+    return f"{_timestamp_prefix}.{int((now - second) * 1000):03d}"
+
+
+def write_stream_log(output_file, log_queue, sample_dtype):
+    """Drains received chunks from the queue into the human-readable log.
+
+    Runs on its own thread so formatting and disk writes never block
+    playback. A ``None`` item marks the end of the stream. A write
+    error is logged and ends the thread.
+    """
+    batch = []
+    batch_chunks = 0
+
+    # Bind hot-loop methods to locals once
+    queue_get = log_queue.get
+    batch_append = batch.append
+    file_writelines = output_file.writelines
+    frombuffer = np.frombuffer
+    itemsize = sample_dtype.itemsize
+
+    try:
+        while True:
+            item = queue_get()
+            if item is None:
+                break
+            timestamp, chunk_counter, data = item
+
+            # Convert binary data to numerical values based on bit depth
+            # 8-bit audio is unsigned bytes, 16-bit is signed
+            # little-endian shorts (a trailing odd byte is ignored)
+            values = frombuffer(
+                data, dtype=sample_dtype, count=len(data) // itemsize
+            )
+
+            # Write a sample of values (first 10 or fewer if available)
+            sample_values = ", ".join(map(str, values[:10].tolist()))
+            batch_append(
+                LOG_LINE_FORMAT(timestamp, chunk_counter, sample_values)
+            )
+
+            # Every 100 chunks, also write detailed values separately
+            if chunk_counter % 100 == 0:
+                batch.append(
+                    f"\nDetailed Sample Values for Chunk #{chunk_counter}:\n"
+                )
+                batch.extend(map(LOG_SAMPLE_FORMAT, range(len(values)),
+                                 values.tolist()))
+                batch.append("-" * 80 + "\n")
+
+            batch_chunks += 1
+            if batch_chunks >= LOG_BATCH_CHUNKS:
+                file_writelines(batch)
+                batch.clear()
+                batch_chunks = 0
+
+        output_file.writelines(batch)
+    except Exception as e:
+        # Stop logging (the stream keeps playing; the receive loop
+        # drops chunks once the queue fills)
+        logging.error(f"Data log writer stopped: {e}")
+
+
 def play_stream(config):
     """Connects to the server and plays the received audio stream."""
 
@@ -29,12 +245,29 @@ def play_stream(config):
         p.terminate()
         return
 
+    # PortAudio pulls audio from this buffer on its own thread, so socket
+    # jitter and GIL contention no longer stall the output device
+    frame_bytes = (config.bits // 8) * config.channels
+    silence_byte = DEFAULT_U8_SILENCE_BYTE_VALUE if config.bits == 8 else 0
+    bytes_per_sec = config.sample_rate * frame_bytes
+    playback_buffer = PlaybackBuffer(
+        max(PLAYBACK_BUFFER_PERIODS * config.buffer_size * frame_bytes,
+            4 * bytes_per_sec * JITTER_MAX_MS // 1000),
+        silence_byte,
+        frame_bytes,
+        bytes_per_sec,
+    )
+
+    def playback_callback(in_data, frame_count, time_info, status):
+        return playback_buffer.pop(frame_count * frame_bytes), pyaudio.paContinue
+
     try:
         stream = p.open(format=audio_format,
                         channels=config.channels,
                         rate=config.sample_rate,
                         output=True,
-                        frames_per_buffer=config.buffer_size)
+                        frames_per_buffer=config.buffer_size,
+                        stream_callback=playback_callback)
     except OSError as e:
         logging.error(f"Failed to open PyAudio stream: {e}")
         logging.error(
@@ -46,7 +279,9 @@ def play_stream(config):
     # --- Output File Setup ---
     output_filename = f"audio_stream_{config.sample_rate}hz_{config.bits}bit_{config.channels}ch.txt"
     logging.info(f"Writing audio data to human-readable file: {output_filename}")
-    output_file = open(output_filename, 'w')
+    output_file = open(
+        output_filename, 'w', buffering=LOG_FILE_BUFFER_BYTES
+    )
     
     # Write header information
     output_file.write(f"Audio Stream Data\n")
@@ -59,52 +294,63 @@ def play_stream(config):
     
     # Counter for chunks received
     chunk_counter = 0
+    dropped_log_chunks = 0
+
+    # Log formatting and file writes happen off the receive thread
+    sample_dtype = np.dtype(np.uint8 if config.bits == 8 else '<i2')
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX_CHUNKS)
+    log_thread = threading.Thread(
+        target=write_stream_log,
+        args=(output_file, log_queue, sample_dtype),
+        daemon=True,
+    )
+    log_thread.start()
 
     # --- Socket Connection ---
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            # Disable Nagle and enlarge the receive buffer to absorb bursts
+            # (buffer size must be set before connect to affect the window)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF_BYTES)
             logging.info(f"Connecting to {config.host}:{config.port}...")
             s.connect((config.host, config.port))
+            if hasattr(socket, 'TCP_QUICKACK'):  # Linux only
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
             logging.info("Connected. Receiving audio stream...")
 
+            # Receive into one preallocated buffer instead of a new
+            # bytes object per recv
+            rx_buf = bytearray(config.buffer_size)
+            rx_mv = memoryview(rx_buf)
+
+            # Bind hot-loop attributes and methods to locals once
+            buffer_size = config.buffer_size
+            sock_recv_into = s.recv_into
+            buffer_push = playback_buffer.push
+            log_put = log_queue.put_nowait
+
             while True:
                 try:
                     # Receive data in chunks matching buffer size
-                    data = s.recv(config.buffer_size)
-                    if not data:
+                    n = sock_recv_into(rx_mv, buffer_size)
+                    if n == 0:
                         logging.info("Stream ended (server disconnected).")
+                        # Let the callback play out what is still buffered
+                        playback_buffer.wait_until_empty(timeout=1.0)
                         break
-                                        # Convert to human-readable format and write to file
-                    timestamp = time.strftime("%H:%M:%S.%f")[:-3]
+                    data = rx_mv[:n].tobytes()
+
+                    # Queue received data for the playback callback
+                    buffer_push(data)
+
+                    # Hand the chunk to the log writer; never block playback
+                    timestamp = chunk_timestamp()
                     chunk_counter += 1
-                    
-                    # Convert binary data to numerical values based on bit depth
-                    if config.bits == 8:
-                        # For 8-bit audio, interpret as unsigned bytes
-                        values = list(data)
-                    else:  # 16-bit
-                        # For 16-bit audio, interpret as signed shorts (2 bytes per sample)
-                        values = []
-                        for i in range(0, len(data), 2):
-                            if i+1 < len(data):
-                                value = int.from_bytes(data[i:i+2], byteorder='little', signed=True)
-                                values.append(value)
-                    
-                    # Write a sample of values (first 10 or fewer if less available)
-                    sample_size = min(10, len(values))
-                    sample_values = ", ".join(str(values[i]) for i in range(sample_size))
-                    
-                    output_file.write(f"{timestamp},{chunk_counter},[{sample_values}...]\n")
-                    
-                    # Every 100 chunks, also write detailed values to separate section
-                    if chunk_counter % 100 == 0:
-                        output_file.write("\nDetailed Sample Values for Chunk #{chunk_counter}:\n")
-                        for i, value in enumerate(values):
-                            output_file.write(f"  Sample {i}: {value}\n")
-                        output_file.write("-" * 80 + "\n")
-
-                    # Write received data to the audio stream
-                    stream.write(data)
+                    try:
+                        log_put((timestamp, chunk_counter, data))
+                    except queue.Full:
+                        dropped_log_chunks += 1
                 except socket.error as e:
                     logging.error(f"Socket error during recv: {e}")
                     break
@@ -123,6 +369,26 @@ def play_stream(config):
     finally:
         # --- Cleanup ---
         logging.info("Cleaning up...")
+        # The writer may have stopped on an error with the queue full
+        if log_thread.is_alive():
+            try:
+                log_queue.put(None, timeout=LOG_FLUSH_TIMEOUT_S)
+            except queue.Full:
+                logging.warning("Data log writer is not responding.")
+        log_thread.join(timeout=LOG_FLUSH_TIMEOUT_S)
+        try:
+            output_file.close()
+        except OSError as e:
+            logging.error(f"Error closing data log: {e}")
+        if dropped_log_chunks:
+            logging.warning(
+                f"Dropped {dropped_log_chunks} chunks from the data log."
+            )
+        logging.info(
+            f"Jitter buffer: target {playback_buffer.target_ms:.0f}ms, "
+            f"{playback_buffer.underruns} underruns, "
+            f"{playback_buffer.dropped_bytes} bytes dropped to catch up."
+        )
         if 'stream' in locals() and stream.is_active():
             stream.stop_stream()
             stream.close()
@@ -1,9 +1,171 @@
+import errno
+import selectors
 import socket
+import sys
 import threading
+from collections import deque
 import pyaudio
 import struct
 import time
 
+# Kernel receive buffer size for the audio client
+SOCKET_BUFFER_BYTES = 1 << 20
+# Audio configuration sent to each client: sample rate, sample width, chunk size
+CONFIG_HEADER = struct.Struct('!III')
+# Chunks buffered per client before the oldest are dropped
+CLIENT_QUEUE_CHUNKS = 32
+# Kernel send buffer per client, in chunks (Linux doubles it). Kept small
+# so a slow client backs up into its drop-oldest queue instead of
+# building seconds of latency in the socket
+CLIENT_SNDBUF_CHUNKS = 4
+
+# Linux zero-copy send; the socket module does not export these names
+SO_ZEROCOPY = getattr(socket, 'SO_ZEROCOPY', 60)
+MSG_ZEROCOPY = getattr(socket, 'MSG_ZEROCOPY', 0x4000000)
+SO_EE_ORIGIN_ZEROCOPY = 5
+# Below roughly this batch size pinning pages costs more than the copy it
+# saves; single chunks are smaller, so only the backlog of a lagging client
+# goes out zero-copy
+ZEROCOPY_MIN_BYTES = 10 * 1024
+# struct sock_extended_err: errno, origin, type, code, pad, info, data
+SOCK_EXTENDED_ERR = struct.Struct('=IBBBBII')
+# Scatter-gather sendmsg is unavailable on Windows
+HAVE_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# Consecutive capture errors tolerated before the microphone is reopened
+MAX_TRANSIENT_AUDIO_ERRORS = 3
+# Exponential backoff before each reopen attempt, in seconds
+AUDIO_REOPEN_BACKOFF_S = 0.1
+AUDIO_REOPEN_BACKOFF_MAX_S = 5.0
+# Captured chunks buffered between the PyAudio callback and the broadcast loop
+CAPTURE_QUEUE_CHUNKS = 32
+# No captured audio for this long counts as a stream error
+CAPTURE_TIMEOUT_S = 1.0
+
+class ClientSender:
+    def __init__(self, sock, address, on_disconnect, max_chunks=CLIENT_QUEUE_CHUNKS,
+                 zerocopy=False):
+        """
+        Own a client socket and send queued audio to it on a dedicated thread.
+        
+        Args:
+            sock (socket.socket): Connected client socket
+            address (tuple): Client address, for log messages
+            on_disconnect (callable): Called with this sender once it stops
+            max_chunks (int): Queue length; the oldest chunk is dropped when full
+            zerocopy (bool): Allow MSG_ZEROCOPY for batches of at least
+                ZEROCOPY_MIN_BYTES (Linux only, falls back to copying sends)
+        """
+        self.sock = sock
+        self.address = address
+        self.on_disconnect = on_disconnect
+        self.queue = deque(maxlen=max_chunks)
+        self.ready = threading.Event()
+        self.alive = True
+        
+        # Chunk batches handed to the kernel by zero-copy sends, kept alive
+        # until their completion notification arrives on the error queue
+        self.zerocopy_pending = deque()
+        self.zerocopy = zerocopy and HAVE_SENDMSG and sys.platform.startswith('linux')
+        if self.zerocopy:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+            except OSError:
+                self.zerocopy = False
+        
+        self.thread = threading.Thread(target=self._send_loop)
+        self.thread.daemon = True
+    
+    def start(self):
+        """Start the sender thread."""
+        self.thread.start()
+    
+    def enqueue(self, data):
+        """Queue a chunk without blocking; a lagging client loses its oldest audio."""
+        self.queue.append(data)
+        self.ready.set()
+    
+    def close(self):
+        """Stop the sender thread and close the socket."""
+        self.alive = False
+        self.ready.set()
+        self.sock.close()
+    
+    def _send_loop(self):
+        """Drain the queue into the socket until the client goes away."""
+        while self.alive:
+            self.ready.wait()
+            # Clear before draining so a chunk queued meanwhile re-arms the event
+            self.ready.clear()
+            while self.alive and self.queue:
+                # Take everything queued so far and send it in one syscall
+                chunks = []
+                while self.queue:
+                    chunks.append(self.queue.popleft())
+                try:
+                    self._send(chunks)
+                except (socket.error, BrokenPipeError):
+                    self.alive = False
+        
+        self.zerocopy_pending.clear()
+        self.on_disconnect(self)
+    
+    def _send(self, chunks):
+        """Send a batch of chunks with scatter-gather sendmsg, zero-copy when enabled."""
+        if not HAVE_SENDMSG:
+            for data in chunks:
+                self.sock.sendall(data)
+            return
+        
+        buffers = [memoryview(data) for data in chunks]
+        # Decide per batch: only a drained backlog is big enough to pay off
+        use_zerocopy = (
+            self.zerocopy and sum(map(len, buffers)) >= ZEROCOPY_MIN_BYTES
+        )
+        flags = MSG_ZEROCOPY if use_zerocopy else 0
+        while buffers:
+            try:
+                sent = self.sock.sendmsg(buffers, [], flags)
+            except OSError as e:
+                if not (flags and e.errno == errno.ENOBUFS):
+                    raise
+                # Out of pinned-page budget: copy the rest the normal way
+                flags = 0
+                continue
+            if flags:
+                # Each successful zero-copy call gets one completion id
+                self.zerocopy_pending.append(chunks)
+            
+            # Drop what was fully sent and trim a partially sent buffer
+            while sent:
+                if sent >= len(buffers[0]):
+                    sent -= len(buffers.pop(0))
+                else:
+                    buffers[0] = buffers[0][sent:]
+                    sent = 0
+        
+        if self.zerocopy_pending:
+            self._reap_zerocopy()
+    
+    def _reap_zerocopy(self):
+        """Release chunk batches whose zero-copy sends the kernel has completed."""
+        while self.zerocopy_pending:
+            try:
+                _, ancdata, _, _ = self.sock.recvmsg(
+                    0, 1024, socket.MSG_ERRQUEUE | socket.MSG_DONTWAIT
+                )
+            except (BlockingIOError, InterruptedError):
+                return
+            for _level, _type, cmsg_data in ancdata:
+                _, origin, _, _, _, first, last = SOCK_EXTENDED_ERR.unpack_from(cmsg_data)
+                if origin != SO_EE_ORIGIN_ZEROCOPY:
+                    continue
+                # TCP completes in order, so release from the front
+                completed = ((last - first) & 0xFFFFFFFF) + 1
+                for _ in range(min(completed, len(self.zerocopy_pending))):
+                    self.zerocopy_pending.popleft()
+
+
 class AudioTCPServer:
     def __init__(self, host='0.0.0.0', port=5555, sample_rate=44100, sample_width=2):
         """
@@ -20,10 +182,19 @@ class AudioTCPServer:
         self.sample_rate = sample_rate
         self.sample_width = sample_width
         self.chunk_size = 1024  # Number of frames per buffer
-        self.clients = []
+        # Immutable tuple, replaced (never mutated) under self.lock so the
+        # audio thread can iterate it without locking
+        self.clients = ()
         self.running = False
         self.lock = threading.Lock()
         
+        # Filled by the PyAudio capture callback, drained by _audio_stream
+        self.capture_queue = deque(maxlen=CAPTURE_QUEUE_CHUNKS)
+        self.capture_ready = threading.Event()
+        
+        # Writing to the shutdown pair wakes the accept loop immediately
+        self._shutdown_r, self._shutdown_w = socket.socketpair()
+        
         # Initialize PyAudio
         self.p = pyaudio.PyAudio()
         
@@ -53,65 +224,125 @@ class AudioTCPServer:
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server_socket.bind((self.host, self.port))
             server_socket.listen(5)
+            server_socket.setblocking(False)
             print(f"Audio server listening on {self.host}:{self.port}")
             print(f"Configuration: {self.sample_rate}Hz, {self.sample_width*8}bit")
             
-            while self.running:
-                try:
-                    server_socket.settimeout(1.0)
-                    client_socket, address = server_socket.accept()
-                    print(f"Client connected from {address}")
-                    
-                    # Send audio configuration to client
-                    config = struct.pack('!III', self.sample_rate, self.sample_width, self.chunk_size)
-                    client_socket.send(config)
-                    
-                    with self.lock:
-                        self.clients.append(client_socket)
-                        
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    print(f"Error accepting client: {e}")
+            # Sleep in the kernel until a client connects or stop_server()
+            # signals, instead of waking up every second to poll
+            with selectors.DefaultSelector() as selector:
+                selector.register(server_socket, selectors.EVENT_READ)
+                selector.register(self._shutdown_r, selectors.EVENT_READ)
+                
+                while self.running:
+                    for key, _ in selector.select():
+                        if key.fileobj is self._shutdown_r:
+                            self.running = False
+                            break
+                        self._accept_client(server_socket)
+    
+    def _accept_client(self, server_socket):
+        """Accept one pending connection and start streaming to it."""
+        try:
+            client_socket, address = server_socket.accept()
+            client_socket.setblocking(True)
+            print(f"Client connected from {address}")
+            
+            # Send small audio chunks immediately instead of letting
+            # Nagle's algorithm batch them
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF,
+                CLIENT_SNDBUF_CHUNKS * self.chunk_size * self.sample_width
+            )
+            
+            # Send audio configuration to client
+            config = CONFIG_HEADER.pack(self.sample_rate, self.sample_width, self.chunk_size)
+            client_socket.send(config)
+            
+            sender = ClientSender(
+                client_socket, address, self._remove_client,
+                zerocopy=True
+            )
+            with self.lock:
+                self.clients = self.clients + (sender,)
+            sender.start()
+                
+        except BlockingIOError:
+            # The pending connection went away before accept
+            pass
+        except Exception as e:
+            print(f"Error accepting client: {e}")
+    
+    def _capture_callback(self, in_data, frame_count, time_info, status):
+        """PyAudio callback: hand captured audio to the broadcast loop."""
+        self.capture_queue.append(in_data)
+        self.capture_ready.set()
+        return (None, pyaudio.paContinue)
+    
+    def _open_input_stream(self):
+        """Open the microphone input stream in callback mode."""
+        return self.p.open(
+            format=self.format,
+            channels=1,  # Mono audio
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._capture_callback
+        )
     
     def _audio_stream(self):
         """Capture audio from microphone and broadcast to clients."""
         try:
             # Open microphone stream
-            stream = self.p.open(
-                format=self.format,
-                channels=1,  # Mono audio
-                rate=self.sample_rate,
-                input=True,
-                frames_per_buffer=self.chunk_size
-            )
+            stream = self._open_input_stream()
             
             print("Microphone stream started")
             
+            consecutive_errors = 0
             while self.running:
                 try:
-                    # Read audio data from microphone
-                    data = stream.read(self.chunk_size, exception_on_overflow=False)
+                    # Wait for the capture callback to deliver audio
+                    if not self.capture_ready.wait(CAPTURE_TIMEOUT_S):
+                        raise TimeoutError("No audio captured from microphone")
+                    # Clear before draining so a chunk queued meanwhile re-arms the event
+                    self.capture_ready.clear()
+                    consecutive_errors = 0
                     
-                    # Broadcast to all connected clients
-                    with self.lock:
-                        disconnected_clients = []
-                        
+                    # Hand each chunk to every client's sender using the
+                    # current snapshot; a slow client never blocks capture
+                    while self.capture_queue:
+                        data = self.capture_queue.popleft()
                         for client in self.clients:
-                            try:
-                                client.send(data)
-                            except (socket.error, BrokenPipeError):
-                                disconnected_clients.append(client)
-                        
-                        # Remove disconnected clients
-                        for client in disconnected_clients:
-                            self.clients.remove(client)
-                            client.close()
-                            print("Client disconnected")
+                            client.enqueue(data)
                             
                 except Exception as e:
-                    print(f"Audio stream error: {e}")
-                    time.sleep(0.1)
+                    # Retry transient errors immediately; only back off and
+                    # reopen the device once they keep repeating
+                    consecutive_errors += 1
+                    category = type(e).__name__
+                    if isinstance(e, OSError) and e.errno is not None:
+                        category += f" [errno {e.errno}]"
+                    print(f"Audio stream error ({category}, "
+                          f"{consecutive_errors} in a row): {e}")
+                    
+                    if consecutive_errors <= MAX_TRANSIENT_AUDIO_ERRORS:
+                        continue
+                    
+                    reopen_attempt = consecutive_errors - MAX_TRANSIENT_AUDIO_ERRORS - 1
+                    backoff = min(AUDIO_REOPEN_BACKOFF_S * 2 ** reopen_attempt,
+                                  AUDIO_REOPEN_BACKOFF_MAX_S)
+                    print(f"Reopening microphone stream in {backoff:.2f}s")
+                    try:
+                        stream.close()
+                    except Exception:
+                        pass
+                    time.sleep(backoff)
+                    try:
+                        stream = self._open_input_stream()
+                        print("Microphone stream reopened")
+                    except Exception as reopen_error:
+                        print(f"Failed to reopen microphone stream: {reopen_error}")
             
             stream.stop_stream()
             stream.close()
@@ -119,14 +350,25 @@ class AudioTCPServer:
         except Exception as e:
             print(f"Error setting up audio stream: {e}")
     
+    def _remove_client(self, sender):
+        """Drop a client whose sender thread has stopped."""
+        with self.lock:
+            self.clients = tuple(c for c in self.clients if c is not sender)
+        sender.sock.close()
+        print(f"Client disconnected: {sender.address}")
+    
     def stop_server(self):
         """Stop the server and clean up resources."""
         self.running = False
+        try:
+            self._shutdown_w.send(b'\0')
+        except OSError:
+            pass
         
         with self.lock:
             for client in self.clients:
                 client.close()
-            self.clients.clear()
+            self.clients = ()
         
         self.p.terminate()
         print("Server stopped")
@@ -142,12 +384,16 @@ class AudioTCPClient:
     def connect_and_play(self):
         """Connect to server and play received audio."""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES)
             client_socket.connect((self.host, self.port))
+            if hasattr(socket, 'TCP_QUICKACK'):  # Linux only
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
             print(f"Connected to {self.host}:{self.port}")
             
             # Receive audio configuration
-            config_data = client_socket.recv(12)
-            sample_rate, sample_width, chunk_size = struct.unpack('!III', config_data)
+            config_data = client_socket.recv(CONFIG_HEADER.size, socket.MSG_WAITALL)
+            sample_rate, sample_width, chunk_size = CONFIG_HEADER.unpack(config_data)
             
             format_map = {
                 1: pyaudio.paInt8,
@@ -166,12 +412,16 @@ class AudioTCPClient:
             
             print(f"Playing audio: {sample_rate}Hz, {sample_width*8}bit")
             
+            # Reuse one receive buffer for the whole stream
+            rx_buf = bytearray(chunk_size * sample_width)
+            rx_mv = memoryview(rx_buf)
+            
             try:
                 while True:
-                    data = client_socket.recv(chunk_size * sample_width)
-                    if not data:
+                    n = client_socket.recv_into(rx_mv)
+                    if n == 0:
                         break
-                    stream.write(data)
+                    stream.write(rx_mv[:n].tobytes())
             except KeyboardInterrupt:
                 print("Client stopped")
             finally:
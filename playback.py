@@ -1,7 +1,8 @@
 import argparse
-import base64
+import mmap
 import numpy as np
 import pyaudio
+import re
 import sys
 import wave
 import os
@@ -9,12 +10,50 @@ import logging
 from datetime import datetime
 import struct
 
+# Optional: pybase64 decodes with SIMD (libbase64); both functions accept
+# bytes and skip non-alphabet characters such as a trailing '\r'.
+try:
+    from pybase64 import b64decode as decode_base64
+except ImportError:
+    from binascii import a2b_base64 as decode_base64
+
+# Optional: Numba compiles the float -> PCM conversion into one fused loop.
+# Without it the NumPy in-place conversion below is used.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# One match per input line. Well-formed lines capture the first four
+# comma-separated fields; anything else matches the bare fallback branch.
+LINE_PATTERN = re.compile(
+    rb'^(?:([^,\n]*),([^,\n]*),([^,\n]*),([^,\n]*)[^\n]*|[^\n]*)$',
+    re.MULTILINE
+)
+
+if njit is not None:
+    # Chunks are a few thousand samples at most, too small for parallel=True
+    # to pay back its thread start-up; fastmath still lets LLVM vectorize.
+    @njit(fastmath=True, cache=True)
+    def float_to_int16(src, dst):
+        """Clip float32 samples to [-1.0, 1.0] and scale into int16 dst."""
+        for i in range(src.size):
+            x = min(max(src[i], -1.0), 1.0)
+            dst[i] = np.int16(x * 32767.0)
+
+    @njit(fastmath=True, cache=True)
+    def float_to_uint8(src, dst):
+        """Clip float32 samples to [-1.0, 1.0] and shift/scale into uint8 dst."""
+        for i in range(src.size):
+            x = min(max(src[i], -1.0), 1.0)
+            dst[i] = np.uint8((x + 1.0) * 127.5)
+
 def decode_base64_audio(input_file, output_file=None, sample_rate=16000, channels=1, play_audio=False, output_bit_depth=16):
     """
     Reads a file containing base64-encoded 32-bit floating point audio data and decodes it.
@@ -63,29 +102,42 @@ def decode_base64_audio(input_file, output_file=None, sample_rate=16000, channel
     # Stats
     total_samples = 0
     total_chunks = 0
-    decoded_samples = []  # Store all decoded samples if output_file is specified
+    float_chunks = []  # Raw float32 chunks if output_file is specified
+    decoded_chunks = []  # Converted chunks if output_file is specified
+
+    log_chunk_stats = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    # Conversion buffers reused across chunks to avoid per-chunk temporaries
+    scratch_float = np.empty(0, dtype=np.float32)
+    scratch_int = np.empty(0, dtype=output_dtype)
 
     try:
-        with open(input_file, 'r') as f:
-            for line_num, line in enumerate(f, 1):
+        with open(input_file, 'rb') as f:
+            # Scan the mapped file with a bytes regex instead of building
+            # a str and a split() list per line (empty files cannot be mapped)
+            if os.fstat(f.fileno()).st_size:
+                contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                contents = b''
+            for line_num, match in enumerate(LINE_PATTERN.finditer(contents), 1):
                 try:
                     # Skip empty lines or commented lines
-                    if not line.strip() or line.strip().startswith('#'):
+                    line = match.group(0).strip()
+                    if not line or line.startswith(b'#'):
                         continue
 
                     # Parse the line
-                    parts = line.strip().split(',')
-                    if len(parts) < 4:
-                        logging.warning(f"Line {line_num}: Invalid format (expected 4 parts, got {len(parts)})")
+                    if match.group(4) is None:
+                        logging.warning(f"Line {line_num}: Invalid format (expected 4 parts, got {line.count(b',') + 1})")
                         continue
 
-                    start_timestamp = parts[0]
-                    end_timestamp = parts[1]
-                    num_samples = int(parts[2])
-                    base64_data = parts[3]
+                    start_timestamp = match.group(1).strip().decode()
+                    end_timestamp = match.group(2).decode()
+                    num_samples = int(match.group(3))
+                    base64_data = match.group(4)
 
                     # Decode base64 data
-                    binary_data = base64.b64decode(base64_data)
+                    binary_data = decode_base64(base64_data)
 
                     # Convert to numpy array of 32-bit floats (little endian)
                     float_samples = np.frombuffer(binary_data, dtype=np.float32)
@@ -98,22 +150,43 @@ def decode_base64_audio(input_file, output_file=None, sample_rate=16000, channel
 
                     # Print summary for this chunk
                     logging.info(f"Chunk {line_num}: {start_timestamp} to {end_timestamp}, {len(float_samples)} samples")
-                    if len(float_samples) > 0:
+                    # The range/average scan is three extra passes per chunk,
+                    # so only pay for it when debug output is enabled
+                    if len(float_samples) > 0 and log_chunk_stats:
                         min_val = np.min(float_samples)
                         max_val = np.max(float_samples)
                         avg_val = np.mean(float_samples)
-                        logging.info(f"  Float range: {min_val:.6f} to {max_val:.6f}, Average: {avg_val:.6f}")
+                        logging.debug(f"  Float range: {min_val:.6f} to {max_val:.6f}, Average: {avg_val:.6f}")
 
                     # Convert float32 [-1.0, 1.0] to output format (int16 or uint8)
-                    # First clip to [-1.0, 1.0] to handle any out-of-range values
-                    float_samples = np.clip(float_samples, -1.0, 1.0)
+                    # Work in the reusable scratch buffers, growing them if needed
+                    n = len(float_samples)
+                    if n > len(scratch_int):
+                        scratch_float = np.empty(n, dtype=np.float32)
+                        scratch_int = np.empty(n, dtype=output_dtype)
+                    int_samples = scratch_int[:n]
 
-                    if output_bit_depth == 8:
-                        # For 8-bit audio, scale and shift to [0, 255]
-                        int_samples = (((float_samples + 1.0) / 2.0) * 255.0).astype(output_dtype)
+                    if njit is not None:
+                        # Fused clip + scale + cast, no intermediate buffer
+                        if output_bit_depth == 8:
+                            float_to_uint8(float_samples, int_samples)
+                        else:
+                            float_to_int16(float_samples, int_samples)
                     else:
-                        # For 16-bit audio, scale to [-32768, 32767]
-                        int_samples = (float_samples * 32767.0).astype(output_dtype)
+                        work = scratch_float[:n]
+
+                        # First clip to [-1.0, 1.0] to handle any out-of-range values
+                        np.clip(float_samples, -1.0, 1.0, out=work)
+
+                        if output_bit_depth == 8:
+                            # For 8-bit audio, scale and shift to [0, 255]
+                            np.add(work, 1.0, out=work)
+                            np.multiply(work, 127.5, out=work)
+                        else:
+                            # For 16-bit audio, scale to [-32768, 32767]
+                            np.multiply(work, 32767.0, out=work)
+
+                        np.copyto(int_samples, work, casting='unsafe')
 
                     # Play audio if requested
                     if play_audio and stream and len(int_samples) > 0:
@@ -122,7 +195,9 @@ def decode_base64_audio(input_file, output_file=None, sample_rate=16000, channel
                     # Write to WAV file if requested
                     if wav_file:
                         wav_file.writeframes(int_samples.tobytes())
-                        decoded_samples.extend(int_samples)
+                        # int_samples views the reusable scratch buffer, so copy it
+                        float_chunks.append(float_samples)
+                        decoded_chunks.append(int_samples.copy())
 
                     # Update stats
                     total_samples += len(float_samples)
@@ -144,13 +219,13 @@ def decode_base64_audio(input_file, output_file=None, sample_rate=16000, channel
         if output_file:
             # Save float32 version
             np_output_file = os.path.splitext(output_file)[0] + '_float32.npy'
-            float_array = np.frombuffer(binary_data, dtype=np.float32)
+            float_array = np.concatenate(float_chunks or [np.empty(0, dtype=np.float32)])
             np.save(np_output_file, float_array)
             logging.info(f"Saved raw float32 samples to NumPy file: {np_output_file}")
 
             # Save converted version
             np_output_file = os.path.splitext(output_file)[0] + f'_{output_bit_depth}bit.npy'
-            decoded_samples_array = np.array(decoded_samples, dtype=output_dtype)
+            decoded_samples_array = np.concatenate(decoded_chunks or [np.empty(0, dtype=output_dtype)])
             np.save(np_output_file, decoded_samples_array)
             logging.info(f"Saved converted {output_bit_depth}-bit samples to NumPy file: {np_output_file}")
 
@@ -183,9 +258,14 @@ def main():
                         help='Number of audio channels')
     parser.add_argument('--play', '-p', action='store_true',
                         help='Play audio during processing')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Log per-chunk float range and average')
 
     args = parser.parse_args()
 
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
     # Generate default output filename if not specified
     if not args.output and args.play is False:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
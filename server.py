@@ -1,17 +1,49 @@
 # server.py
 import argparse
+import asyncio
+import ctypes
 import logging
+import mmap
+import multiprocessing
 import os
-import random
+import signal
 import socket
 import struct
-import threading
+import sys
 import time
 import wave
+from itertools import chain
+
+import numpy as np
+
+# Optional: libsndfile (via soundfile) parses and reads 16-bit WAVs in C.
+# It cannot hand back unsigned 8-bit PCM unchanged, and --sendfile and
+# --mmap need the data chunk's offset, so those paths always use wave.
+try:
+    import soundfile
+except (ImportError, OSError):
+    soundfile = None
 
 # --- Constants ---
 # Default u8 silence is 128 (midpoint of 0-255)
 DEFAULT_U8_SILENCE_BYTE_VALUE = 128
+# Kernel send buffer for each client connection
+SOCKET_SNDBUF_BYTES = 1 << 20
+NS_PER_SEC = 1_000_000_000
+# Linux per-socket pacing cap in bytes/sec (not exported by every Python)
+SO_MAX_PACING_RATE = getattr(socket, "SO_MAX_PACING_RATE", 47)
+# Packet headers count against the pacing rate, so allow some headroom;
+# a client that is full pushes back through TCP flow control anyway
+KERNEL_PACING_HEADROOM = 1.1
+# inotify flags and events (linux/inotify.h) that change the playlist
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+AUDIO_DIR_EVENTS = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -30,157 +62,562 @@ def get_wav_files(directory):
     return files
 
 
+def check_wav_format(wf, filepath, expected_rate, expected_bits,
+                     expected_channels):
+    """Checks an open WAV file against the expected format, logging why not."""
+    rate = wf.getframerate()
+    # Use passed arguments for validation
+    if rate != expected_rate:
+        logging.warning(
+            f"Skipping {filepath}: Incorrect sample rate "
+            f"({rate} Hz). Expected {expected_rate} Hz."
+        )
+        return False
+    sampwidth_bits = wf.getsampwidth() * 8
+    # Use passed arguments for validation
+    if sampwidth_bits != expected_bits:
+        logging.warning(
+            f"Skipping {filepath}: Incorrect bit depth "
+            f"({sampwidth_bits}-bit). Expected {expected_bits}-bit."
+        )
+        return False
+    nchannels = wf.getnchannels()
+    # Use passed arguments for validation
+    if nchannels != expected_channels:
+        logging.warning(
+            f"Skipping {filepath}: Incorrect channel count "
+            f"({nchannels}). Expected {expected_channels}."
+        )
+        return False
+    return True
+
+
+def find_wav_data_chunk(f):
+    """Returns (offset, length) of the 'data' chunk in an open RIFF file."""
+    f.seek(12)  # Skip the RIFF/WAVE header
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise wave.Error("data chunk not found")
+        chunk_id, chunk_len = struct.unpack("<4sI", header)
+        if chunk_id == b"data":
+            return f.tell(), chunk_len
+        # Chunks are padded to an even length
+        f.seek(chunk_len + (chunk_len & 1), os.SEEK_CUR)
+
+
+def file_identity(f):
+    """Returns what identifies the version of an open file on disk."""
+    st = os.fstat(f.fileno())
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def read_wav_layout(filepath, expected_rate, expected_bits,
+                    expected_channels):
+    """Validates a WAV file and locates its PCM data without reading it.
+
+    Returns (data_offset, data_len, file_id) for streaming straight from
+    the file with sendfile, or None if the file is unusable. file_id is
+    the file_identity of the version that was validated.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            with wave.open(f, "rb") as wf:
+                if not check_wav_format(wf, filepath, expected_rate,
+                                        expected_bits, expected_channels):
+                    return None
+                frames_len = (
+                    wf.getnframes() * wf.getsampwidth() * wf.getnchannels()
+                )
+            data_offset, chunk_len = find_wav_data_chunk(f)
+            file_id = file_identity(f)
+        # Same length readframes() would return (whole frames only)
+        data_len = min(frames_len, chunk_len)
+        logging.info(
+            f"Found {data_len} bytes at offset {data_offset} in {filepath}"
+        )
+        return data_offset, data_len, file_id
+    except (wave.Error, EOFError) as e:
+        # wave raises EOFError for an empty or truncated header
+        logging.error(f"Error reading WAV {filepath}: {e}")
+        return None
+    except FileNotFoundError:
+        logging.error(f"WAV file not found: {filepath}")
+        return None
+    except OSError as e:
+        logging.error(f"Error opening WAV {filepath}: {e}")
+        return None
+
+
 # Pass expected format parameters
 def read_wav_data(filepath, expected_rate, expected_bits, expected_channels):
-    """Reads raw audio data from a WAV file, ensuring correct format."""
+    """Reads raw audio data from a WAV file, ensuring correct format.
+
+    The header is parsed and validated once by read_wav_layout; the PCM
+    is then fetched with one read of the data chunk, bypassing wave's
+    frame reader. 16-bit files are read with libsndfile when available.
+    """
+    if soundfile is not None and expected_bits == 16:
+        return read_wav_data_sndfile(
+            filepath, expected_rate, expected_channels
+        )
+    layout = read_wav_layout(
+        filepath, expected_rate, expected_bits, expected_channels
+    )
+    if layout is None:
+        return None
+    data_offset, data_len, _ = layout
     try:
-        with wave.open(filepath, "rb") as wf:
-            rate = wf.getframerate()
-            # Use passed arguments for validation
-            if rate != expected_rate:
+        with open(filepath, "rb") as f:
+            f.seek(data_offset)
+            frames = f.read(data_len)
+    except OSError as e:
+        logging.error(f"Error reading WAV {filepath}: {e}")
+        return None
+    logging.info(f"Read {len(frames)} bytes from {filepath}")
+    return frames
+
+
+def read_wav_data_sndfile(filepath, expected_rate, expected_channels):
+    """Reads 16-bit PCM from a WAV file with libsndfile, checking format."""
+    try:
+        with soundfile.SoundFile(filepath) as sf:
+            if sf.samplerate != expected_rate:
                 logging.warning(
                     f"Skipping {filepath}: Incorrect sample rate "
-                    f"({rate} Hz). Expected {expected_rate} Hz."
+                    f"({sf.samplerate} Hz). Expected {expected_rate} Hz."
                 )
                 return None
-            sampwidth_bits = wf.getsampwidth() * 8
-            # Use passed arguments for validation
-            if sampwidth_bits != expected_bits:
+            if sf.subtype != "PCM_16":
                 logging.warning(
-                    f"Skipping {filepath}: Incorrect bit depth "
-                    f"({sampwidth_bits}-bit). Expected {expected_bits}-bit."
+                    f"Skipping {filepath}: Incorrect sample format "
+                    f"({sf.subtype}). Expected 16-bit."
                 )
                 return None
-            nchannels = wf.getnchannels()
-            # Use passed arguments for validation
-            if nchannels != expected_channels:
+            if sf.channels != expected_channels:
                 logging.warning(
                     f"Skipping {filepath}: Incorrect channel count "
-                    f"({nchannels}). Expected {expected_channels}."
+                    f"({sf.channels}). Expected {expected_channels}."
                 )
                 return None
-
-            frames = wf.readframes(wf.getnframes())
-            logging.info(f"Read {len(frames)} bytes from {filepath}")
-            return frames
-    except wave.Error as e:
-        # Shortened line 89
+            frames = bytes(sf.buffer_read(dtype="int16"))
+    except (RuntimeError, OSError) as e:
+        # soundfile reports unreadable files as LibsndfileError,
+        # a RuntimeError
         logging.error(f"Error reading WAV {filepath}: {e}")
         return None
-    except FileNotFoundError:
-        # Shortened line 96
-        logging.error(f"WAV file not found: {filepath}")
+    logging.info(f"Read {len(frames)} bytes from {filepath}")
+    return frames
+
+
+def map_wav_data(filepath, expected_rate, expected_bits, expected_channels):
+    """Maps a WAV file read-only and returns a memoryview of its PCM.
+
+    The pages are the OS page cache itself, so the audio costs no
+    private memory however many clients stream it.
+    """
+    layout = read_wav_layout(
+        filepath, expected_rate, expected_bits, expected_channels
+    )
+    if layout is None:
+        return None
+    data_offset, data_len, _ = layout
+    try:
+        with open(filepath, "rb") as f:
+            # The mapping stays valid after the file is closed
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error mapping WAV {filepath}: {e}")
+        return None
+    logging.info(f"Mapped {data_len} bytes from {filepath}")
+    return memoryview(mm)[data_offset: data_offset + data_len]
+
+
+def load_audio(filepath, config):
+    """Validates one WAV file and loads what streaming it needs.
+
+    Returns the PCM bytes (a memoryview of a mapping with --mmap), or
+    with --sendfile the (data_offset, data_len, file_id) of the PCM
+    inside the file. Returns None if the file is unusable.
+    """
+    if config.mmap:
+        return map_wav_data(
+            filepath, config.sample_rate, config.bits, config.channels
+        )
+    if config.sendfile:
+        return read_wav_layout(
+            filepath, config.sample_rate, config.bits, config.channels
+        )
+    return read_wav_data(
+        filepath, config.sample_rate, config.bits, config.channels
+    )
+
+
+def load_audio_tracks(wav_files, audio_cache, config):
+    """Returns (filepath, audio, schedule) for each usable file.
+
+    audio_cache maps filepath to (st_mtime_ns, track), with None as the
+    track for files that failed validation. A file is re-read (and its
+    schedule rebuilt) only when it is new or its mtime has changed, and
+    entries for files no longer listed are dropped.
+    """
+    tracks = []
+    for filepath in wav_files:
+        try:
+            mtime_ns = os.stat(filepath).st_mtime_ns
+        except OSError as e:
+            logging.warning(f"Skipping {filepath}: {e}")
+            audio_cache.pop(filepath, None)
+            continue
+        cached = audio_cache.get(filepath)
+        if cached is None or cached[0] != mtime_ns:
+            # Replacing the whole entry keeps concurrent lookups safe;
+            # at worst two loaders read the same file once each
+            audio = load_audio(filepath, config)
+            track = None
+            if audio is not None:
+                track = (
+                    filepath, audio,
+                    build_schedule(
+                        filepath, audio, config, config.send_batch_bytes
+                    )
+                )
+            cached = (mtime_ns, track)
+            audio_cache[filepath] = cached
+        track = cached[1]
+        if track is not None:
+            tracks.append(track)
+    # Forget files no longer in the directory, releasing their audio
+    # (and with --mmap their mapping, once no client still streams it).
+    # list() snapshots the keys, as another loader may be filling them
+    listed = set(wav_files)
+    for filepath in list(audio_cache):
+        if filepath not in listed:
+            audio_cache.pop(filepath, None)
+    return tracks
+
+
+def chunks_of(view, size):
+    """Yields consecutive slices of a memoryview, each at most size bytes."""
+    for i in range(0, len(view), size):
+        yield view[i: i + size]
+
+
+def file_ranges(offset, length, size):
+    """Yields (offset, length) pieces of a file region, each at most size."""
+    end = offset + length
+    for i in range(offset, end, size):
+        yield i, min(size, end - i)
+
+
+def read_file_range(filepath, offset, length, file_id):
+    """Reads length bytes at offset from a file, or None on error.
+
+    Also returns None if the file is no longer the version file_id.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            if file_identity(f) != file_id:
+                return None
+            f.seek(offset)
+            return f.read(length)
+    except OSError as e:
+        logging.warning(f"Error reading {filepath}: {e}")
+        return None
+
+
+def build_schedule(filepath, audio, config, batch_bytes):
+    """Plans a track's sends as (batch, batch_len, deadline_ns) tuples.
+
+    The batches cover the audio and then the silence after it, so both
+    form one paced stream. A batch is a memoryview slice (or bytes), or
+    with --sendfile a (file offset, length) pair. deadline_ns is when
+    the next send is due, counted from the track's first byte.
+    """
+    if config.sendfile:
+        data_offset, audio_len, file_id = audio
+        audio_batches = list(
+            file_ranges(data_offset, audio_len, batch_bytes)
+        )
+    else:
+        # memoryview slices avoid copying the audio data
+        audio_batches = list(chunks_of(memoryview(audio), batch_bytes))
+    silence = config.silence_view
+
+    # Top up a short last audio batch with the start of the silence, so
+    # the seam between them goes out as one write (and full segments)
+    # rather than two small ones. Only this one batch is copied.
+    if audio_batches and silence:
+        tail = audio_batches[-1]
+        tail_len = tail[1] if isinstance(tail, tuple) else len(tail)
+        fill = min(batch_bytes - tail_len, len(silence))
+        if fill > 0 and isinstance(tail, tuple):
+            # Read the tail from disk only when silence will join it
+            tail = read_file_range(filepath, *tail, file_id)
+        if fill > 0 and tail is not None:
+            audio_batches[-1] = b"".join((tail, silence[:fill]))
+            silence = silence[fill:]
+
+    batches = chain(audio_batches, chunks_of(silence, batch_bytes))
+    schedule = []
+    bytes_planned = 0
+    for batch in batches:
+        batch_len = batch[1] if isinstance(batch, tuple) else len(batch)
+        bytes_planned += batch_len
+        schedule.append((
+            batch, batch_len,
+            bytes_planned * NS_PER_SEC // config.bytes_per_sec
+        ))
+    return tuple(schedule)
+
+
+def open_inotify(directory, mask):
+    """Returns a non-blocking inotify fd watching directory.
+
+    Returns None where inotify is unavailable (non-Linux systems, or
+    the per-user watch limit is reached).
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError, TypeError):
+        return None
+    fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        logging.warning(
+            f"inotify unavailable: {os.strerror(ctypes.get_errno())}"
+        )
+        return None
+    if inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        logging.warning(
+            f"Cannot watch '{directory}': "
+            f"{os.strerror(ctypes.get_errno())}"
+        )
+        os.close(fd)
         return None
+    return fd
+
+
+class AudioLibrary:
+    """The playable tracks of the audio directory, kept current.
+
+    tracks is replaced as a whole and never mutated, so every client can
+    take it as-is. With inotify the directory is rescanned only when it
+    changes; without it, it is rescanned for each new client.
+    """
+
+    def __init__(self, config, audio_cache, tracks):
+        self.config = config
+        self.audio_cache = audio_cache
+        self.tracks = tracks
+        self._inotify_fd = None
+        self._rescan_task = None
+        self._rescan_pending = False
+
+    async def rescan(self):
+        """Lists the directory and loads new or changed files."""
+        # Disk work runs off the event loop so other clients' pacing
+        # is not disturbed
+        wav_files = await asyncio.to_thread(
+            get_wav_files, self.config.audio_dir
+        )
+        if not wav_files:
+            logging.warning(f"No WAV files in '{self.config.audio_dir}'.")
+        self.tracks = await asyncio.to_thread(
+            load_audio_tracks, wav_files, self.audio_cache, self.config
+        )
+        return self.tracks
+
+    async def get_tracks(self):
+        """Returns the current tracks for a new client."""
+        if self._inotify_fd is None:
+            return await self.rescan()
+        return self.tracks
+
+    def watch(self):
+        """Starts watching the directory; returns False if unsupported."""
+        fd = open_inotify(self.config.audio_dir, AUDIO_DIR_EVENTS)
+        if fd is None:
+            return False
+        self._inotify_fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_inotify)
+        return True
+
+    def close(self):
+        """Stops watching the directory."""
+        if self._inotify_fd is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._rescan_task:
+            self._rescan_task.cancel()
+
+    def _on_inotify(self):
+        # Drain all queued events; any of them means one rescan
+        try:
+            while os.read(self._inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._rescan_pending = True
+        if self._rescan_task is None or self._rescan_task.done():
+            self._rescan_task = asyncio.get_running_loop().create_task(
+                self._rescan_while_pending()
+            )
+
+    async def _rescan_while_pending(self):
+        # Events arriving during a rescan are folded into one more pass
+        while self._rescan_pending:
+            self._rescan_pending = False
+            try:
+                await self.rescan()
+            except Exception as e:
+                logging.error(f"Error rescanning audio dir: {e}")
+
+
+async def sleep_until(deadline_ns):
+    """Sleeps until time.monotonic_ns() reaches an absolute deadline.
+
+    Deadlines are integer nanoseconds, so a wakeup's lateness is never
+    carried into the next one; only the remaining wait becomes a float.
+    """
+    delay_ns = deadline_ns - time.monotonic_ns()
+    if delay_ns > 0:
+        await asyncio.sleep(delay_ns / NS_PER_SEC)
 
 
 # --- Client Handling ---
 # Updated signature later to accept config
-def handle_client(conn, addr, wav_files, config):
-    """Handles a single client connection."""
+async def handle_client(writer, addr, library, config, kernel_paced=False):
+    """Streams to a single client connection.
+
+    Runs as a coroutine on the server's event loop, so many paced
+    streams share one thread. Each pass over the playlist takes the
+    library's current tracks, a shared, read-only list of (filepath,
+    audio, schedule) from load_audio_tracks, so no file is re-read and
+    no send is re-planned per client or per loop. With
+    kernel_paced the socket is already rate-limited, so each file and
+    its silence are written whole and no pacing sleeps are taken.
+    """
     logging.info(f"Connected by {addr}")
+    loop = asyncio.get_running_loop()
     client_active = True
-    wav_indices = list(range(len(wav_files)))  # Indices to shuffle
+    # One generator per client; permutation shuffles in C
+    rng = np.random.default_rng()
+    # Pacing clock for the whole connection: each batch is due at
+    # stream_start_ns + bytes sent so far / bytes_per_sec, in exact
+    # integer nanoseconds however long the stream runs
+    bytes_per_sec = config.bytes_per_sec
+    stream_start_ns = time.monotonic_ns()
+    bytes_sent_total = 0
+    warned_no_tracks = False
 
     try:
         while client_active:
+            # Latest playlist, so replaced or new files are picked up;
+            # only rescans here if the directory cannot be watched
+            tracks = await library.get_tracks()
+            if not tracks and not warned_no_tracks:
+                logging.warning(f"No playable WAV files for client {addr}.")
+                warned_no_tracks = True
             # Shuffle order for this loop iteration
-            random.shuffle(wav_indices)
+            wav_indices = rng.permutation(len(tracks))
+            pass_start_bytes = bytes_sent_total
             for index in wav_indices:
-                filepath = wav_files[index]
-                logging.info(f"[{addr}] Streaming file: {filepath}")
-                # Pass config values to read_wav_data
-                audio_data = read_wav_data(
-                    filepath,
-                    config.sample_rate,
-                    config.bits,
-                    config.channels
+                filepath, audio, schedule = tracks[index]
+                logging.info(
+                    f"[{addr}] Streaming file: {filepath} "
+                    f"(+{config.silence_ms}ms silence)"
                 )
+                wav_file = None
+                if config.sendfile:
+                    # Zero-copy: the kernel sends straight from the file
+                    try:
+                        wav_file = open(filepath, "rb")
+                    except OSError as e:
+                        logging.warning(f"[{addr}] Skipping {filepath}: {e}")
+                        continue  # Skip to the next file if it went away
+                    if file_identity(wav_file) != audio[2]:
+                        # Offsets and tail bytes are for the version
+                        # that was loaded; the rescan brings the new one
+                        logging.info(
+                            f"[{addr}] Skipping {filepath}: changed "
+                            f"since it was loaded"
+                        )
+                        wav_file.close()
+                        continue
+                if kernel_paced:
+                    # One write for the audio and one for the silence
+                    audio_len = audio[1] if config.sendfile else len(audio)
+                    schedule = build_schedule(
+                        filepath, audio, config,
+                        max(audio_len, len(config.silence_view), 1)
+                    )
 
-                if audio_data is None:
-                    logging.warning(f"[{addr}] Skipping file: {filepath}")
-                    continue  # Skip to the next file if this one is bad
-
-                # Stream the audio data in chunks
-                start_time = time.monotonic()
-                bytes_sent_total = 0
-                # loop_start_time removed (unused)
-                # Use config values for chunking and timing
-                chunk_size_bytes = config.chunk_size_bytes
-                bytes_per_sec = config.bytes_per_sec
-
-                for i in range(0, len(audio_data), chunk_size_bytes):
-                    chunk = audio_data[i: i + chunk_size_bytes]
-                    if not chunk:
-                        break  # End of data
+                # Deadlines in the schedule count from the file's first
+                # byte; one division per file places it on the stream clock
+                file_start_ns = stream_start_ns + (
+                    bytes_sent_total * NS_PER_SEC // bytes_per_sec
+                )
 
+                # Stream the audio data in batches of chunks
+                # One send (and one pacing sleep) covers a whole batch
+                for batch, batch_len, deadline_ns in schedule:
                     try:
-                        conn.sendall(chunk)
-                        bytes_sent_total += len(chunk)
-
-                        # Calculate expected time for chunk and sleep if needed
-                        # Removed comment line 112
-                        elapsed_time_file = time.monotonic() - start_time
-                        # bytes_per_sec already calculated above
-                        expected_time_file = bytes_sent_total / bytes_per_sec
-                        sleep_time = expected_time_file - elapsed_time_file
-                        if sleep_time > 0:
-                            time.sleep(sleep_time)
-                        # else: we are falling behind, log potentially?
-                        # logging.warning(
-                        #    f"[{addr}] Falling behind: {sleep_time:.4f}s"
-                        # )
+                        if isinstance(batch, tuple):
+                            # (file offset, length) for sendfile
+                            await loop.sendfile(
+                                writer.transport, wav_file,
+                                batch[0], batch_len
+                            )
+                        else:
+                            writer.write(batch)
+                            await writer.drain()
+                        bytes_sent_total += batch_len
+
+                        # Wait for the absolute deadline of the next batch
+                        if not kernel_paced:
+                            await sleep_until(file_start_ns + deadline_ns)
 
                     except (BrokenPipeError, ConnectionResetError):
                         logging.info(f"Client {addr} disconnected.")
                         client_active = False
                         break
                     except Exception as e:
-                        logging.error(f"Error sending data to {addr}: {e}")
+                        # loop.sendfile reports a dropped peer as a
+                        # RuntimeError on the closing transport
+                        if writer.is_closing():
+                            logging.info(f"Client {addr} disconnected.")
+                        else:
+                            logging.error(f"Error sending data to {addr}: {e}")
                         client_active = False
                         break
 
+                if wav_file:
+                    wav_file.close()
+
                 if not client_active:
                     break  # Exit outer loop if client disconnected
 
-                # Send silence between files
-                logging.info(f"[{addr}] {config.silence_ms}ms silence")
-                try:
-                    conn.sendall(config.silence_bytes)
-                    # Add silence duration to timing calculation
-                    # Next file's start_time accounts for silence
-                    # silence_start_time removed (unused)
-                    # bytes_per_sec already calculated above
-                    silence_dur = len(config.silence_bytes) / bytes_per_sec
-                    # Sleep for the calculated silence duration
-                    # Assumes sendall is relatively quick
-                    time.sleep(max(0, silence_dur))
-
-                    # Reset start time for the next file's pacing
-                    start_time = time.monotonic()
-                    bytes_sent_total = 0  # Reset byte count
-
-                except (BrokenPipeError, ConnectionResetError):
-                    logging.info(f"Client {addr} disconnected during silence.")
-                    client_active = False
-                    break
-                except Exception as e:
-                    logging.error(f"Error sending silence to {addr}: {e}")
-                    client_active = False
-                    break
-
             if not client_active:
                 break  # Exit outer loop if client disconnected
 
-            # Small sleep at the end of the loop to prevent
-            # tight spinning if no files
-            if not wav_files:
-                time.sleep(1)
+            # Small sleep at the end of the loop to prevent tight
+            # spinning (and starving every other client on the loop)
+            # when no file could be sent this pass
+            if bytes_sent_total == pass_start_bytes:
+                await asyncio.sleep(1)
 
     except Exception as e:
         logging.error(f"Client handler exception for {addr}: {e}")
     finally:
         logging.info(f"Closing connection to {addr}")
-        conn.close()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
 
 
 # --- Server Main Logic ---
@@ -210,50 +647,146 @@ def start_server(config):
         )
         # Client handler loop handles empty list case
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        # Allow reuse of address
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        try:
-            s.bind((config.host, config.port))
-            s.listen()
-            logging.info(f"Server listening on {config.host}:{config.port}")
-            abs_audio_dir = os.path.abspath(audio_dir)
-            logging.info(f"Streaming from: {abs_audio_dir}")
-            # Fix line length L224
-            logging.info(
-                f"Format: {config.sample_rate} Hz, {config.bits}-bit "
-                f"{config.channels}-channel"
+    # Validate and load every file once; clients share the loaded audio
+    audio_cache = {}
+    tracks = load_audio_tracks(wav_files, audio_cache, config)
+
+    library = AudioLibrary(config, audio_cache, tracks)
+    try:
+        if config.workers > 1:
+            run_workers(config, library)
+        else:
+            asyncio.run(serve(config, library))
+    except OSError as e:
+        logging.error(f"Server failed to bind or listen: {e}")
+    except KeyboardInterrupt:
+        logging.info("Server shutting down.")
+    finally:
+        logging.info("Server stopped.")
+
+
+def run_worker(config, library):
+    """Entry point of one worker process started by run_workers."""
+    try:
+        asyncio.run(serve(config, library))
+    except OSError as e:
+        logging.error(f"Worker failed to bind or listen: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(config, library):
+    """Runs config.workers copies of the server, all on the same port.
+
+    Each worker is a forked process with its own event loop and its own
+    SO_REUSEPORT listener, so the kernel spreads new connections over
+    per-worker accept queues and the streams run on several cores.
+    Audio loaded before the fork is shared copy-on-write.
+    """
+    ctx = multiprocessing.get_context("fork")
+    workers = [
+        ctx.Process(
+            target=run_worker, args=(config, library),
+            name=f"audio-worker-{i}"
+        )
+        for i in range(config.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    logging.info(f"Started {len(workers)} workers")
+    # Stopping the parent must stop the workers too (set after the
+    # fork, so the workers keep the default handler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+
+async def serve(config, library):
+    """Accepts clients and streams to each from a single event loop."""
+    # At most max_clients streams run at once; later clients wait
+    # (connected, but not yet sent anything) for a free slot
+    client_slots = asyncio.Semaphore(config.max_clients)
+
+    async def on_connect(reader, writer):
+        addr = writer.get_extra_info("peername")
+        conn = writer.get_extra_info("socket")
+        # Send each paced chunk immediately (no Nagle delay) and
+        # give the kernel room to absorb it without blocking
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        kernel_paced = False
+        if config.kernel_pacing:
+            # The kernel releases bytes at the stream rate; a send
+            # buffer of two chunks keeps the writer just ahead of it
+            try:
+                conn.setsockopt(
+                    socket.SOL_SOCKET, SO_MAX_PACING_RATE,
+                    int(config.bytes_per_sec * KERNEL_PACING_HEADROOM)
+                )
+                conn.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_SNDBUF,
+                    2 * config.chunk_size_bytes
+                )
+                # Hold nothing in user space, so drain() waits on
+                # the kernel's pacing rather than filling a buffer
+                writer.transport.set_write_buffer_limits(high=0)
+                kernel_paced = True
+            except OSError as e:
+                logging.warning(
+                    f"Kernel pacing unavailable for {addr}, "
+                    f"pacing in the server instead: {e}"
+                )
+        if not kernel_paced:
+            conn.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SNDBUF_BYTES
+            )
+        if client_slots.locked():
+            logging.warning(
+                f"{config.max_clients} clients streaming; "
+                f"{addr} waits for a free slot."
+            )
+        async with client_slots:
+            # Pass config down to client handler; it takes the current
+            # playlist once its slot is open
+            await handle_client(
+                writer, addr, library, config, kernel_paced=kernel_paced
             )
-            logging.info(f"Chunk Duration: {config.chunk_ms}ms")
-            logging.info(f"Silence Between Files: {config.silence_ms}ms")
-
-            while True:
-                try:
-                    conn, addr = s.accept()
-                    # Refresh the list of wav files for each new connection
-                    # Use the *configured* audio dir
-                    current_wav_files = get_wav_files(config.audio_dir)
-                    if not current_wav_files:
-                        logging.warning(
-                            f"No WAV files in '{config.audio_dir}'\
-                                  for client {addr}."
-                        )
-                    # Pass config down to client handler
-                    client_thread = threading.Thread(
-                        target=handle_client,
-                        args=(conn, addr, list(current_wav_files), config),
-                        daemon=True,
-                    )
-                    client_thread.start()
-                except Exception as e:
-                    logging.error(f"Error accepting/starting thread: {e}")
 
-        except OSError as e:
-            logging.error(f"Server failed to bind or listen: {e}")
-        except KeyboardInterrupt:
-            logging.info("Server shutting down.")
+    # Allow reuse of address; with several workers each one binds its
+    # own listener to the port
+    server = await asyncio.start_server(
+        on_connect, config.host, config.port, reuse_address=True,
+        reuse_port=config.workers > 1
+    )
+    if library.watch():
+        logging.info(f"Watching '{config.audio_dir}' for changes")
+    async with server:
+        logging.info(
+            f"Server listening on {config.host}:{config.port} "
+            f"(pid {os.getpid()})"
+        )
+        abs_audio_dir = os.path.abspath(config.audio_dir)
+        logging.info(f"Streaming from: {abs_audio_dir}")
+        # Fix line length L224
+        logging.info(
+            f"Format: {config.sample_rate} Hz, {config.bits}-bit "
+            f"{config.channels}-channel"
+        )
+        logging.info(f"Chunk Duration: {config.chunk_ms}ms")
+        logging.info(f"Chunks Per Send: {config.batch_chunks}")
+        logging.info(f"Max Concurrent Clients: {config.max_clients}")
+        logging.info(f"Silence Between Files: {config.silence_ms}ms")
+        if config.kernel_pacing:
+            logging.info("Pacing: kernel (SO_MAX_PACING_RATE)")
+        try:
+            await server.serve_forever()
         finally:
-            logging.info("Server stopped.")
+            library.close()
 
 
 if __name__ == "__main__":
@@ -282,6 +815,32 @@ if __name__ == "__main__":
     parser.add_argument(
         '--silence-ms', type=int, default=10,
         help='Silence duration between files (ms, default: 10)')
+    parser.add_argument(
+        '--batch-chunks', type=int, default=4,
+        help='Chunks sent per socket write and pacing sleep (default: 4)')
+    parser.add_argument(
+        '--max-clients', type=int, default=256,
+        help='Clients streamed at once per worker; more wait for a free '
+             'slot (default: 256)')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Worker processes sharing the port via SO_REUSEPORT '
+             '(default: 1)')
+    source_mode = parser.add_mutually_exclusive_group()
+    source_mode.add_argument(
+        '--sendfile', action='store_true',
+        help='Stream WAV data from disk with zero-copy sendfile '
+             'instead of reading it into memory')
+    source_mode.add_argument(
+        '--mmap', action='store_true',
+        help='Memory-map WAV files instead of reading them into memory; '
+             'replace files atomically (rename), since truncating a '
+             'mapped file crashes the server')
+    parser.add_argument(
+        '--kernel-pacing', action='store_true',
+        help='Let the kernel pace each socket with SO_MAX_PACING_RATE '
+             'instead of sleeping between sends (Linux; fq qdisc '
+             'recommended)')
 
     args = parser.parse_args()
 
@@ -289,25 +848,35 @@ if __name__ == "__main__":
     args.bytes_per_sample = (args.bits // 8) * args.channels
     args.chunk_size_samples = int(args.sample_rate * (args.chunk_ms / 1000))
     args.chunk_size_bytes = args.chunk_size_samples * args.bytes_per_sample
+    args.batch_chunks = max(1, args.batch_chunks)
+    args.max_clients = max(1, args.max_clients)
+    args.workers = max(1, args.workers)
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers needs SO_REUSEPORT, which this "
+                     "platform lacks")
+    args.send_batch_bytes = args.chunk_size_bytes * args.batch_chunks
     args.silence_samples = int(args.sample_rate * (args.silence_ms / 1000))
 
     # Determine silence byte value based on bit depth
+    # bytes * int fills the buffer in C, no per-byte Python objects
     if args.bits == 8:
-        silence_val = DEFAULT_U8_SILENCE_BYTE_VALUE
         num_silence_bytes = args.silence_samples * args.bytes_per_sample
-        silence_bytes_list = [silence_val] * num_silence_bytes
-        args.silence_bytes = bytes(silence_bytes_list)
+        args.silence_bytes = (
+            bytes([DEFAULT_U8_SILENCE_BYTE_VALUE]) * num_silence_bytes
+        )
     elif args.bits == 16:
-        # For 16-bit PCM, silence is typically 0.
-        # Pack '0' as little-endian signed short ('<h') per sample/channel.
-        silence_val = 0
-        silence_sample_bytes = struct.pack('<h', silence_val) * args.channels
-        args.silence_bytes = silence_sample_bytes * args.silence_samples
+        # For 16-bit PCM, silence is 0: two zero bytes per sample/channel
+        args.silence_bytes = (
+            b'\x00\x00' * (args.silence_samples * args.channels)
+        )
     else:
         # Should not happen due to argparse choices, but good practice
         logging.error(f"Unsupported bit depth: {args.bits}. Exiting.")
         exit(1)
 
+    # One read-only view of the silence, sliced by every client
+    args.silence_view = memoryview(args.silence_bytes)
+
     # Calculate bytes per second AFTER calculating bytes_per_sample
     args.bytes_per_sec = args.sample_rate * args.bytes_per_sample
 